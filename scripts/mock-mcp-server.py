@@ -4,47 +4,368 @@ Mock MCP Server - Responds to MCP agent requests
 Simulates a realistic Model Context Protocol server
 """
 
-import json
+import asyncio
+import orjson
+import os
+import re
+import selectors
+import stat
 import sys
+import threading
 import time
 import random
 from typing import Dict, Any
 
+# Static catalog served by the mock server. Defined once at module
+# level and pre-encoded so list handlers are a pure cached-bytes send.
+_TOOLS = (
+    {
+        "name": "read_file",
+        "description": "Read contents of a file",
+        "inputSchema": {
+            "type": "object",
+            "properties": {
+                "path": {"type": "string"}
+            },
+            "required": ["path"]
+        }
+    },
+    {
+        "name": "write_file",
+        "description": "Write content to a file",
+        "inputSchema": {
+            "type": "object",
+            "properties": {
+                "path": {"type": "string"},
+                "content": {"type": "string"}
+            },
+            "required": ["path", "content"]
+        }
+    },
+    {
+        "name": "list_directory",
+        "description": "List files in a directory",
+        "inputSchema": {
+            "type": "object",
+            "properties": {
+                "path": {"type": "string"}
+            },
+            "required": ["path"]
+        }
+    },
+    {
+        "name": "execute_command",
+        "description": "Execute a shell command",
+        "inputSchema": {
+            "type": "object",
+            "properties": {
+                "command": {"type": "string"}
+            },
+            "required": ["command"]
+        }
+    },
+    {
+        "name": "search_code",
+        "description": "Search for code patterns",
+        "inputSchema": {
+            "type": "object",
+            "properties": {
+                "pattern": {"type": "string"},
+                "file_type": {"type": "string"}
+            },
+            "required": ["pattern"]
+        }
+    }
+)
+
+_RESOURCES = (
+    {
+        "uri": "file:///workspace/src/main.rs",
+        "name": "main.rs",
+        "mimeType": "text/x-rust"
+    },
+    {
+        "uri": "file:///workspace/src/lib.rs",
+        "name": "lib.rs",
+        "mimeType": "text/x-rust"
+    },
+    {
+        "uri": "file:///workspace/Cargo.toml",
+        "name": "Cargo.toml",
+        "mimeType": "text/x-toml"
+    },
+    {
+        "uri": "file:///workspace/README.md",
+        "name": "README.md",
+        "mimeType": "text/markdown"
+    }
+)
+
+_PROMPTS = (
+    {
+        "name": "code_review",
+        "description": "Review code for best practices",
+        "arguments": [
+            {
+                "name": "code",
+                "description": "Code to review",
+                "required": True
+            }
+        ]
+    },
+    {
+        "name": "debug_error",
+        "description": "Help debug an error message",
+        "arguments": [
+            {
+                "name": "error",
+                "description": "Error message",
+                "required": True
+            }
+        ]
+    }
+)
+
+_TOOLS_RESULT = orjson.dumps({"tools": _TOOLS})
+_RESOURCES_RESULT = orjson.dumps({"resources": _RESOURCES})
+_PROMPTS_RESULT = orjson.dumps({"prompts": _PROMPTS})
+
+# Fast path for the parameter-less list methods: the mock agent (like
+# most MCP clients) emits them with a fixed key order, so a regex can
+# lift id and method straight out of the line without a JSON parse.
+# Anything else falls back to orjson.loads.
+_FAST_LIST_RE = re.compile(
+    rb'^\{"jsonrpc":"2\.0","id":("[^"\\]*"|-?\d+),'
+    rb'"method":"(tools/list|resources/list|prompts/list)"\}\s*$')
+
+_LIST_RESULTS = {
+    b"tools/list": _TOOLS_RESULT,
+    b"resources/list": _RESOURCES_RESULT,
+    b"prompts/list": _PROMPTS_RESULT,
+}
+
+# Invariant envelope pieces: only the id and result/error vary per
+# message, so responses are composed by byte concatenation instead of
+# building and walking a fresh dict
+_RES_PREFIX = b'{"jsonrpc":"2.0","id":'
+_RES_MID = b',"result":'
+_ERR_MID = b',"error":'
+
+# Canned tool-call outputs. __ARG__ marks where the (escaped) argument is
+# spliced into the pre-encoded response template at call time.
+_TOOL_CALL_TEXTS = {
+    "read_file": "// Mock file content for __ARG__\n"
+                 "fn main() {\n"
+                 "    println!(\"Hello, world!\");\n"
+                 "}\n",
+    "write_file": "Successfully wrote to __ARG__",
+    "list_directory": "main.rs\nlib.rs\nmod.rs\nutils.rs",
+    "execute_command": "Executed: __ARG__\nOutput: Success",
+    "search_code": "src/main.rs:12: async fn process() {\n"
+                   "src/lib.rs:45: async fn handle_request() {",
+}
+
+# Which request argument fills the __ARG__ slot, per tool
+_TOOL_CALL_ARGS = {
+    "read_file": "path",
+    "write_file": "path",
+    "execute_command": "command",
+}
+
+# The interpolated paths/URIs are almost always escape-free ASCII: one
+# compiled-regex scan over the bytes replaces a per-character check, and
+# only the rare unsafe string pays for a full encoder pass.
+_UNSAFE_RE = re.compile(rb'[\x00-\x1f"\\]')
+
+def _escape_json(s: str) -> bytes:
+    """Escape a string for splicing inside a JSON string literal"""
+    b = s.encode("utf-8")
+    if _UNSAFE_RE.search(b) is None:
+        return b
+    return orjson.dumps(s)[1:-1]
+
+def _pollable(stream) -> bool:
+    """Whether the fd can ride an asyncio pipe transport.
+
+    The transport type check alone is not enough: epoll refuses some
+    character devices (notably /dev/null) with EPERM, and that failure
+    only surfaces in a loop callback after connect_read_pipe has
+    already returned — the stream would then never deliver data or EOF.
+    Probing registration with the same selector the loop will use
+    catches it up front.
+    """
+    fd = stream.fileno()
+    mode = os.fstat(fd).st_mode
+    if not (stat.S_ISFIFO(mode) or stat.S_ISSOCK(mode) or stat.S_ISCHR(mode)):
+        return False
+    sel = selectors.DefaultSelector()
+    try:
+        sel.register(fd, selectors.EVENT_READ)
+    except OSError:
+        return False
+    finally:
+        sel.close()
+    return True
+
+class _ThreadLineReader:
+    """Line reader for streams the event loop can't poll (e.g. stdin
+    redirected from a regular file): a daemon thread feeds lines into
+    an asyncio queue."""
+
+    _EOF = object()
+
+    def __init__(self, stream, loop):
+        self._queue = asyncio.Queue()
+
+        def pump():
+            for line in stream:
+                loop.call_soon_threadsafe(self._queue.put_nowait, line)
+            loop.call_soon_threadsafe(self._queue.put_nowait, self._EOF)
+
+        threading.Thread(target=pump, daemon=True).start()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        line = await self._queue.get()
+        if line is self._EOF:
+            raise StopAsyncIteration
+        return line
+
+class _BlockingWriter:
+    """Writer for streams the event loop can't poll (e.g. stdout
+    redirected to a regular file): same interface as StreamWriter, but
+    writes go straight to the buffered stream and drain() flushes it."""
+
+    def __init__(self, stream):
+        self._stream = stream
+
+    def write(self, data: bytes):
+        self._stream.write(data)
+
+    def writelines(self, lines):
+        write = self._stream.write
+        for chunk in lines:
+            write(chunk)
+
+    async def drain(self):
+        self._stream.flush()
+
+async def _stdio_streams():
+    """Wire asyncio streams over the stdin/stdout pipes.
+
+    Pipe transports only accept pipes, sockets and character devices;
+    stdio redirected to a regular file degrades per-side to the
+    thread-fed reader / blocking writer above.
+    """
+    loop = asyncio.get_event_loop()
+    reader = None
+    if _pollable(sys.stdin):
+        try:
+            reader = asyncio.StreamReader(limit=2 ** 20)
+            await loop.connect_read_pipe(
+                lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+        except (OSError, ValueError):
+            reader = None
+    if reader is None:
+        reader = _ThreadLineReader(sys.stdin.buffer, loop)
+    writer = None
+    if _pollable(sys.stdout):
+        try:
+            w_transport, w_protocol = await loop.connect_write_pipe(
+                asyncio.streams.FlowControlMixin, sys.stdout)
+            writer = asyncio.StreamWriter(w_transport, w_protocol, None, loop)
+        except (OSError, ValueError):
+            writer = None
+    if writer is None:
+        writer = _BlockingWriter(sys.stdout.buffer)
+    return reader, writer
+
 class MockMCPServer:
-    """Simulates a realistic MCP server responding to agent requests"""
+    """Simulates a realistic MCP server responding to agent requests.
+
+    I/O runs over asyncio stdio streams: the write transport coalesces
+    response frames and drain() applies backpressure once per incoming
+    line (or batch array) instead of per response.
+    """
 
-    def __init__(self, server_name: str = "mock-server", verbose: bool = False):
+    def __init__(self, server_name: str = "mock-server", verbose: bool = False,
+                 simulate_latency: bool = False):
         self.server_name = server_name
         self.verbose = verbose
+        self.simulate_latency = simulate_latency
         self.initialized = False
+        self._writer = None
+        # When serving a JSON-RPC batch, responses collect here instead
+        # of going straight to the writer
+        self._batch = None
+
+        # Pre-encoded tools/call result templates, split at the argument
+        # slot so a call is prefix + escaped argument + suffix.
+        self._tool_templates = {}
+        for name, text in _TOOL_CALL_TEXTS.items():
+            blob = orjson.dumps({"content": [{"type": "text", "text": text}]})
+            prefix, _, suffix = blob.partition(b"__ARG__")
+            self._tool_templates[name] = (prefix, suffix, _TOOL_CALL_ARGS.get(name))
+
+        # resources/read interpolates the uri twice, so its template has
+        # three pieces around the two slots
+        self._resource_read_parts = orjson.dumps({
+            "contents": [
+                {
+                    "uri": "__ARG__",
+                    "mimeType": "text/plain",
+                    "text": "# Content of __ARG__\n\nThis is mock content for testing."
+                }
+            ]
+        }).split(b"__ARG__")
+
+        # Method routing as a single dict lookup; all handlers share the
+        # (request_id, params) signature
+        self._dispatch = {
+            "initialize": self.handle_initialize,
+            "tools/list": self.handle_tools_list,
+            "tools/call": self.handle_tools_call,
+            "resources/list": self.handle_resources_list,
+            "resources/read": self.handle_resources_read,
+            "prompts/list": self.handle_prompts_list,
+            "prompts/get": self.handle_prompts_get,
+        }
 
     def log(self, message: str):
         """Log to stderr for debugging"""
         if self.verbose:
             print(f"[{self.server_name}] {message}", file=sys.stderr)
 
+    def _emit(self, payload: bytes):
+        """Queue one encoded response frame or collect it into a batch"""
+        if self._batch is None:
+            self._writer.writelines((payload, b"\n"))
+        else:
+            self._batch.append(payload)
+
     def send_response(self, request_id: str, result: Any):
         """Send JSON-RPC response"""
-        response = {
-            "jsonrpc": "2.0",
-            "id": request_id,
-            "result": result
-        }
-        self.log(f"→ Response to {request_id}")
-        print(json.dumps(response), flush=True)
+        if self.verbose:
+            self.log(f"→ Response to {request_id}")
+        self._emit(_RES_PREFIX + orjson.dumps(request_id) +
+                   _RES_MID + orjson.dumps(result) + b"}")
+
+    def send_result_bytes(self, request_id: str, result_bytes: bytes):
+        """Send a JSON-RPC response whose result is pre-encoded JSON"""
+        if self.verbose:
+            self.log(f"→ Response to {request_id}")
+        self._emit(_RES_PREFIX + orjson.dumps(request_id) +
+                   _RES_MID + result_bytes + b"}")
 
     def send_error(self, request_id: str, code: int, message: str):
         """Send JSON-RPC error response"""
-        response = {
-            "jsonrpc": "2.0",
-            "id": request_id,
-            "error": {
-                "code": code,
-                "message": message
-            }
-        }
-        self.log(f"→ Error to {request_id}: {message}")
-        print(json.dumps(response), flush=True)
+        if self.verbose:
+            self.log(f"→ Error to {request_id}: {message}")
+        self._emit(_RES_PREFIX + orjson.dumps(request_id) +
+                   _ERR_MID + orjson.dumps({"code": code, "message": message}) +
+                   b"}")
 
     def handle_initialize(self, request_id: str, params: Dict[str, Any]):
         """Handle initialize request"""
@@ -65,225 +386,70 @@ class MockMCPServer:
         }
         self.send_response(request_id, result)
 
-    def handle_tools_list(self, request_id: str):
+    def handle_tools_list(self, request_id: str, params: Dict[str, Any]):
         """Handle tools/list request"""
-        tools = [
-            {
-                "name": "read_file",
-                "description": "Read contents of a file",
-                "inputSchema": {
-                    "type": "object",
-                    "properties": {
-                        "path": {"type": "string"}
-                    },
-                    "required": ["path"]
-                }
-            },
-            {
-                "name": "write_file",
-                "description": "Write content to a file",
-                "inputSchema": {
-                    "type": "object",
-                    "properties": {
-                        "path": {"type": "string"},
-                        "content": {"type": "string"}
-                    },
-                    "required": ["path", "content"]
-                }
-            },
-            {
-                "name": "list_directory",
-                "description": "List files in a directory",
-                "inputSchema": {
-                    "type": "object",
-                    "properties": {
-                        "path": {"type": "string"}
-                    },
-                    "required": ["path"]
-                }
-            },
-            {
-                "name": "execute_command",
-                "description": "Execute a shell command",
-                "inputSchema": {
-                    "type": "object",
-                    "properties": {
-                        "command": {"type": "string"}
-                    },
-                    "required": ["command"]
-                }
-            },
-            {
-                "name": "search_code",
-                "description": "Search for code patterns",
-                "inputSchema": {
-                    "type": "object",
-                    "properties": {
-                        "pattern": {"type": "string"},
-                        "file_type": {"type": "string"}
-                    },
-                    "required": ["pattern"]
-                }
-            }
-        ]
-        self.send_response(request_id, {"tools": tools})
+        self.send_result_bytes(request_id, _TOOLS_RESULT)
 
     def handle_tools_call(self, request_id: str, params: Dict[str, Any]):
         """Handle tools/call request"""
         tool_name = params.get("name")
         arguments = params.get("arguments", {})
 
-        self.log(f"Calling tool: {tool_name}")
-
-        # Simulate tool execution with realistic responses
-        if tool_name == "read_file":
-            content = f"// Mock file content for {arguments.get('path')}\n"
-            content += "fn main() {\n"
-            content += "    println!(\"Hello, world!\");\n"
-            content += "}\n"
-            result = {
-                "content": [
-                    {
-                        "type": "text",
-                        "text": content
-                    }
-                ]
-            }
-        elif tool_name == "write_file":
-            result = {
-                "content": [
-                    {
-                        "type": "text",
-                        "text": f"Successfully wrote to {arguments.get('path')}"
-                    }
-                ]
-            }
-        elif tool_name == "list_directory":
-            files = ["main.rs", "lib.rs", "mod.rs", "utils.rs"]
-            result = {
-                "content": [
-                    {
-                        "type": "text",
-                        "text": "\n".join(files)
-                    }
-                ]
-            }
-        elif tool_name == "execute_command":
-            result = {
-                "content": [
-                    {
-                        "type": "text",
-                        "text": f"Executed: {arguments.get('command')}\nOutput: Success"
-                    }
-                ]
-            }
-        elif tool_name == "search_code":
-            matches = [
-                "src/main.rs:12: async fn process() {",
-                "src/lib.rs:45: async fn handle_request() {"
-            ]
-            result = {
-                "content": [
-                    {
-                        "type": "text",
-                        "text": "\n".join(matches)
-                    }
-                ]
-            }
-        else:
+        if self.verbose:
+            self.log(f"Calling tool: {tool_name}")
+
+        template = self._tool_templates.get(tool_name)
+        if template is None:
             self.send_error(request_id, -32601, f"Tool not found: {tool_name}")
             return
 
-        # Simulate processing time
-        time.sleep(random.uniform(0.01, 0.05))
-        self.send_response(request_id, result)
+        prefix, suffix, arg_key = template
+        if arg_key is None:
+            body = prefix
+        else:
+            body = prefix + _escape_json(str(arguments.get(arg_key))) + suffix
+
+        # Simulate processing time (opt-in; caps stress throughput)
+        if self.simulate_latency:
+            time.sleep(random.uniform(0.01, 0.05))
+        self.send_result_bytes(request_id, body)
 
-    def handle_resources_list(self, request_id: str):
+    def handle_resources_list(self, request_id: str, params: Dict[str, Any]):
         """Handle resources/list request"""
-        resources = [
-            {
-                "uri": "file:///workspace/src/main.rs",
-                "name": "main.rs",
-                "mimeType": "text/x-rust"
-            },
-            {
-                "uri": "file:///workspace/src/lib.rs",
-                "name": "lib.rs",
-                "mimeType": "text/x-rust"
-            },
-            {
-                "uri": "file:///workspace/Cargo.toml",
-                "name": "Cargo.toml",
-                "mimeType": "text/x-toml"
-            },
-            {
-                "uri": "file:///workspace/README.md",
-                "name": "README.md",
-                "mimeType": "text/markdown"
-            }
-        ]
-        self.send_response(request_id, {"resources": resources})
+        self.send_result_bytes(request_id, _RESOURCES_RESULT)
 
     def handle_resources_read(self, request_id: str, params: Dict[str, Any]):
         """Handle resources/read request"""
         uri = params.get("uri")
-        self.log(f"Reading resource: {uri}")
+        if self.verbose:
+            self.log(f"Reading resource: {uri}")
 
-        content = f"# Content of {uri}\n\nThis is mock content for testing."
-        result = {
-            "contents": [
-                {
-                    "uri": uri,
-                    "mimeType": "text/plain",
-                    "text": content
-                }
-            ]
-        }
+        uri_bytes = _escape_json(str(uri))
+        head, mid, tail = self._resource_read_parts
+        body = head + uri_bytes + mid + uri_bytes + tail
 
-        time.sleep(random.uniform(0.01, 0.03))
-        self.send_response(request_id, result)
+        if self.simulate_latency:
+            time.sleep(random.uniform(0.01, 0.03))
+        self.send_result_bytes(request_id, body)
 
-    def handle_prompts_list(self, request_id: str):
+    def handle_prompts_list(self, request_id: str, params: Dict[str, Any]):
         """Handle prompts/list request"""
-        prompts = [
-            {
-                "name": "code_review",
-                "description": "Review code for best practices",
-                "arguments": [
-                    {
-                        "name": "code",
-                        "description": "Code to review",
-                        "required": True
-                    }
-                ]
-            },
-            {
-                "name": "debug_error",
-                "description": "Help debug an error message",
-                "arguments": [
-                    {
-                        "name": "error",
-                        "description": "Error message",
-                        "required": True
-                    }
-                ]
-            }
-        ]
-        self.send_response(request_id, {"prompts": prompts})
+        self.send_result_bytes(request_id, _PROMPTS_RESULT)
 
     def handle_prompts_get(self, request_id: str, params: Dict[str, Any]):
         """Handle prompts/get request"""
         prompt_name = params.get("name")
         arguments = params.get("arguments", {})
 
-        self.log(f"Getting prompt: {prompt_name}")
+        if self.verbose:
+            self.log(f"Getting prompt: {prompt_name}")
 
         messages = [
             {
                 "role": "user",
                 "content": {
                     "type": "text",
-                    "text": f"Please {prompt_name.replace('_', ' ')} the following:\n{json.dumps(arguments, indent=2)}"
+                    "text": f"Please {prompt_name.replace('_', ' ')} the following:\n{orjson.dumps(arguments, option=orjson.OPT_INDENT_2).decode()}"
                 }
             }
         ]
@@ -293,7 +459,8 @@ class MockMCPServer:
             "messages": messages
         }
 
-        time.sleep(random.uniform(0.01, 0.03))
+        if self.simulate_latency:
+            time.sleep(random.uniform(0.01, 0.03))
         self.send_response(request_id, result)
 
     def handle_request(self, request: Dict[str, Any]):
@@ -302,7 +469,8 @@ class MockMCPServer:
         params = request.get("params", {})
         request_id = request.get("id")
 
-        self.log(f"← {method} (id: {request_id})")
+        if self.verbose:
+            self.log(f"← {method} (id: {request_id})")
 
         # Handle notifications (no response needed)
         if request_id is None:
@@ -311,45 +479,81 @@ class MockMCPServer:
             return
 
         # Route to appropriate handler
-        if method == "initialize":
-            self.handle_initialize(request_id, params)
-        elif method == "tools/list":
-            self.handle_tools_list(request_id)
-        elif method == "tools/call":
-            self.handle_tools_call(request_id, params)
-        elif method == "resources/list":
-            self.handle_resources_list(request_id)
-        elif method == "resources/read":
-            self.handle_resources_read(request_id, params)
-        elif method == "prompts/list":
-            self.handle_prompts_list(request_id)
-        elif method == "prompts/get":
-            self.handle_prompts_get(request_id, params)
-        else:
+        handler = self._dispatch.get(method)
+        if handler is None:
             self.send_error(request_id, -32601, f"Method not found: {method}")
+        else:
+            handler(request_id, params)
 
-    def run(self):
+    async def run(self):
         """Run the server, processing requests from stdin"""
         self.log(f"Server {self.server_name} started, waiting for requests...")
 
+        reader, writer = await _stdio_streams()
+        self._writer = writer
+
+        # Bind the per-message hot path to locals; attribute lookups add
+        # up at stress-mode message rates
+        loads = orjson.loads
+        handle_request = self.handle_request
+        fast_match = _FAST_LIST_RE.match
+        send_result_bytes = self.send_result_bytes
+        drain = writer.drain
+
         try:
-            while True:
-                line = sys.stdin.readline()
+            async for line in reader:
+                line = line.strip()
                 if not line:
-                    break
+                    continue
+
+                # JSON-RPC 2.0 batch: answer the whole array with one
+                # array response and a single write
+                if line[:1] == b"[":
+                    try:
+                        requests = loads(line)
+                    except orjson.JSONDecodeError as e:
+                        self.log(f"Invalid JSON: {e}")
+                        continue
+                    batch = self._batch = []
+                    try:
+                        for request in requests:
+                            # Same guard as the single-request path: one
+                            # bad request yields a -32603 entry instead
+                            # of killing the server mid-batch
+                            try:
+                                handle_request(request)
+                            except Exception as e:
+                                self.log(f"Error handling request: {e}")
+                                if "id" in request:
+                                    self.send_error(request["id"], -32603,
+                                                    str(e))
+                    finally:
+                        self._batch = None
+                    if batch:
+                        writer.writelines((b"[" + b",".join(batch) + b"]", b"\n"))
+                        await drain()
+                    continue
+
+                match = fast_match(line)
+                if match is not None:
+                    request_id, method = match.groups()
+                    if self.verbose:
+                        self.log(f"← {method.decode()} (fast path)")
+                    send_result_bytes(loads(request_id), _LIST_RESULTS[method])
+                    await drain()
+                    continue
 
                 try:
-                    request = json.loads(line)
-                    self.handle_request(request)
-                except json.JSONDecodeError as e:
+                    request = loads(line)
+                    handle_request(request)
+                except orjson.JSONDecodeError as e:
                     self.log(f"Invalid JSON: {e}")
                 except Exception as e:
                     self.log(f"Error handling request: {e}")
                     if "id" in request:
                         self.send_error(request["id"], -32603, str(e))
+                await drain()
 
-        except KeyboardInterrupt:
-            self.log("Server stopped by user")
         except Exception as e:
             self.log(f"Server error: {e}")
             raise
@@ -360,8 +564,13 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Mock MCP Server")
     parser.add_argument("--name", default="mock-server", help="Server name")
     parser.add_argument("--verbose", action="store_true", help="Enable verbose logging")
+    parser.add_argument("--simulate-latency", action="store_true",
+                        help="Add random per-request latency (realistic mode)")
 
     args = parser.parse_args()
 
-    server = MockMCPServer(args.name, args.verbose)
-    server.run()
+    server = MockMCPServer(args.name, args.verbose, args.simulate_latency)
+    try:
+        asyncio.run(server.run())
+    except KeyboardInterrupt:
+        server.log("Server stopped by user")
@@ -16,15 +16,39 @@ Features:
     - Heartbeat to keep connection alive
 """
 
+import sys
+
+# gevent has to monkey-patch the stdlib before flask/time are imported
+# so the per-client time.sleep calls in the SSE generator become
+# cooperative greenlet switches instead of each occupying an OS thread.
+# Opt-in: with the default dev server nothing is patched and gevent
+# need not be installed. (gunicorn's gevent worker patches by itself.)
+if any(arg in ('--gevent', 'gevent') or arg.endswith('=gevent')
+       for arg in sys.argv):
+    from gevent import monkey
+    monkey.patch_all()
+
 from flask import Flask, Response, request, jsonify
+from flask.json.provider import JSONProvider
 from flask_cors import CORS
-import json
+import orjson
 import time
 import argparse
 import random
-import sys
+import threading
+from collections import deque
+
+class OrjsonProvider(JSONProvider):
+    """Route Flask's jsonify/request.json through orjson"""
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
 
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 CORS(app)  # Enable CORS for browser clients
 
 # Configuration
@@ -34,32 +58,37 @@ CONFIG = {
     'mode': 'realistic',
 }
 
+# SSE frames have a fixed shape, so each variant is one %-formatted
+# bytes template: a single allocation per frame, no line list, no join
+_FRAME = b"event: %b\nid: %d\ndata: %b\n\n"
+_FRAME_NOID = b"event: %b\ndata: %b\n\n"
+_FRAME_NOTYPE = b"id: %d\ndata: %b\n\n"
+_FRAME_DATA_ONLY = b"data: %b\n\n"
+
 def format_sse_event(data, event_type='message', event_id=None):
     """
-    Format data as Server-Sent Event
+    Format data as a Server-Sent Event frame (bytes)
 
     SSE Format:
         event: <type>\n
-        id: <id>\n
+        id: <int id>\n
         data: <json>\n\n
-    """
-    lines = []
 
+    A falsy event_type omits the event: line (clients then fall back to
+    the default 'message' type), as the original str implementation did.
+    Returning bytes lets the WSGI layer send each chunk as-is instead of
+    re-encoding a str per frame; orjson already produces bytes and the
+    monotonic counter ids embed via %d without a str round trip. data
+    may be pre-encoded JSON bytes, which are spliced in unchanged.
+    """
+    payload = data if isinstance(data, bytes) else orjson.dumps(data)
     if event_type:
-        lines.append(f"event: {event_type}")
-
+        if event_id:
+            return _FRAME % (event_type.encode('utf-8'), event_id, payload)
+        return _FRAME_NOID % (event_type.encode('utf-8'), payload)
     if event_id:
-        lines.append(f"id: {event_id}")
-
-    # Data can be multi-line, each line prefixed with "data: "
-    json_str = json.dumps(data, ensure_ascii=False)
-    lines.append(f"data: {json_str}")
-
-    # End with double newline
-    lines.append('')
-    lines.append('')
-
-    return '\n'.join(lines)
+        return _FRAME_NOTYPE % (event_id, payload)
+    return _FRAME_DATA_ONLY % payload
 
 def generate_initialize_response(req_id=1):
     """Generate MCP initialize response"""
@@ -152,6 +181,21 @@ def generate_resources_list_response(req_id=3):
         }
     }
 
+# The opening initialize/tools/resources trio is fully static — request
+# ids and event ids are fixed by the stream script — so the complete SSE
+# frames are rendered once at import time instead of per connection.
+_STATIC_FRAMES = (
+    format_sse_event(generate_initialize_response(1),
+                     event_type='mcp-response', event_id=1),
+    format_sse_event(generate_tools_list_response(2),
+                     event_type='mcp-response', event_id=2),
+    format_sse_event(generate_resources_list_response(3),
+                     event_type='mcp-response', event_id=3),
+)
+# The trio also goes out as one chunk: one write instead of three,
+# each frame still ends in \n\n so SSE parsing is unaffected
+_STATIC_BLOB = b"".join(_STATIC_FRAMES)
+
 def generate_tool_call_response(req_id, tool_name):
     """Generate tool call response"""
     results = {
@@ -180,15 +224,17 @@ def generate_tool_call_response(req_id, tool_name):
         "result": result
     }
 
+# The notification envelope is fixed, so it renders straight into a
+# JSON bytes template — no per-call envelope dict
+_NOTIF_TEMPLATE = b'{"jsonrpc":"2.0","method":"%b","params":%b}'
+_NOTIF_NOPARAMS_TEMPLATE = b'{"jsonrpc":"2.0","method":"%b"}'
+
 def generate_notification(method, params=None):
-    """Generate JSON-RPC notification (no id field)"""
-    notif = {
-        "jsonrpc": "2.0",
-        "method": method
-    }
+    """Generate JSON-RPC notification (no id field) as encoded bytes"""
     if params:
-        notif["params"] = params
-    return notif
+        return _NOTIF_TEMPLATE % (method.encode('utf-8'),
+                                  orjson.dumps(params))
+    return _NOTIF_NOPARAMS_TEMPLATE % method.encode('utf-8')
 
 def generate_progress_notification(progress, total=100):
     """Generate progress notification"""
@@ -208,7 +254,8 @@ def generate_log_notification(level, message):
         {
             "level": level,
             "message": message,
-            "timestamp": int(time.time() * 1000)
+            # Single C call; no float multiply + int cast
+            "timestamp": time.time_ns() // 1_000_000
         }
     )
 
@@ -240,62 +287,61 @@ def sse_events():
     # Capture remote_addr before entering generator context
     client_addr = request.remote_addr
 
-    def generate():
+    # Bounded hand-off between the producer (paced by CONFIG['delay'])
+    # and the WSGI consumer (paced by the client socket). A slow client
+    # can no longer back frames up without limit: when the deque is
+    # full, the oldest frame is dropped and counted.
+    frames = deque(maxlen=64)
+    closed = threading.Event()
+    dropped = [0]
+
+    def emit(frame):
+        if len(frames) == frames.maxlen:
+            dropped[0] += 1
+        frames.append(frame)
+
+    def produce():
         print(f"[SSE] Client connected: {client_addr}", file=sys.stderr)
 
         event_counter = 1
 
-        # 1. Initialize response
-        yield format_sse_event(
-            generate_initialize_response(1),
-            event_type='mcp-response',
-            event_id=event_counter
-        )
-        event_counter += 1
-        time.sleep(CONFIG['delay'])
-
-        # 2. Tools list response
-        yield format_sse_event(
-            generate_tools_list_response(2),
-            event_type='mcp-response',
-            event_id=event_counter
-        )
-        event_counter += 1
-        time.sleep(CONFIG['delay'])
-
-        # 3. Resources list response
-        yield format_sse_event(
-            generate_resources_list_response(3),
-            event_type='mcp-response',
-            event_id=event_counter
-        )
-        event_counter += 1
-        time.sleep(CONFIG['delay'])
+        # 1-3. Initialize, tools list and resources list responses,
+        # pre-rendered and batched into a single chunk at import time
+        emit(_STATIC_BLOB)
+        event_counter += 3
+        if closed.wait(CONFIG['delay']):
+            return
 
-        # 4. Generate tool call responses
+        # 4. Generate tool call responses; draw the whole tool sequence
+        # up front with one C-level call instead of a random.choice per
+        # iteration
         tools = ['read_file', 'write_file', 'search_code']
-        for i in range(CONFIG['iterations']):
+        iterations = CONFIG['iterations']
+        selected = random.choices(tools, k=iterations)
+        # Progress percentages as one up-front pass of integer floor
+        # division; no float divide + int() per iteration
+        progress_values = tuple((i + 1) * 100 // iterations
+                                for i in range(iterations))
+        for i in range(iterations):
             req_id = 4 + i
-            tool = random.choice(tools)
+            tool = selected[i]
 
-            # Tool call response
-            yield format_sse_event(
+            # Tool call response + progress notification go out
+            # back-to-back anyway, so batch them into one chunk
+            progress = progress_values[i]
+            emit(format_sse_event(
                 generate_tool_call_response(req_id, tool),
                 event_type='mcp-response',
                 event_id=event_counter
-            )
-            event_counter += 1
-
-            # Progress notification
-            progress = int((i + 1) / CONFIG['iterations'] * 100)
-            yield format_sse_event(
+            ) + format_sse_event(
                 generate_progress_notification(progress),
                 event_type='mcp-notification',
-                event_id=event_counter
-            )
-            event_counter += 1
+                event_id=event_counter + 1
+            ))
+            event_counter += 2
 
-            time.sleep(CONFIG['delay'])
+            if closed.wait(CONFIG['delay']):
+                return
 
         # 5. Log notifications
         log_levels = ['info', 'debug', 'warning']
@@ -306,24 +352,44 @@ def sse_events():
         ]
 
         for level, message in zip(log_levels, log_messages):
-            yield format_sse_event(
+            emit(format_sse_event(
                 generate_log_notification(level, message),
                 event_type='mcp-notification',
                 event_id=event_counter
-            )
+            ))
             event_counter += 1
-            time.sleep(CONFIG['delay'] * 0.5)
+            if closed.wait(CONFIG['delay'] * 0.5):
+                return
 
-        # 6. Keep-alive heartbeat
+        # 6. Keep-alive heartbeat: a fixed SSE comment frame is all
+        # liveness needs — clients ignore it, nothing is re-encoded
         print(f"[SSE] Entering heartbeat mode", file=sys.stderr)
-        while True:
-            time.sleep(30)
-            yield format_sse_event(
-                {"type": "heartbeat", "timestamp": time.time()},
-                event_type='heartbeat',
-                event_id=event_counter
-            )
-            event_counter += 1
+        while not closed.wait(30):
+            emit(b":keepalive\n\n")
+
+    threading.Thread(target=produce, daemon=True).start()
+
+    def generate():
+        try:
+            while True:
+                if frames:
+                    if dropped[0]:
+                        count, dropped[0] = dropped[0], 0
+                        print(f"[SSE] Dropped {count} frame(s) for slow "
+                              f"client {client_addr}", file=sys.stderr)
+                    # Coalesce everything pending into one chunk: one
+                    # transfer-encoding header and one socket write
+                    # instead of one per frame
+                    batch = [frames.popleft()]
+                    while frames:
+                        batch.append(frames.popleft())
+                    yield batch[0] if len(batch) == 1 else b"".join(batch)
+                else:
+                    time.sleep(0.05)
+        finally:
+            # Client went away: stop the producer at its next wait
+            closed.set()
+            print(f"[SSE] Client disconnected: {client_addr}", file=sys.stderr)
 
     return Response(
         generate(),
@@ -332,9 +398,111 @@ def sse_events():
             'Cache-Control': 'no-cache',
             'X-Accel-Buffering': 'no',  # Disable nginx buffering
             'Connection': 'keep-alive'
-        }
+        },
+        # The generator already yields encoded bytes; hand them to the
+        # WSGI server untouched instead of through Werkzeug's per-chunk
+        # encoding path
+        direct_passthrough=True
     )
 
+def build_asgi_app():
+    """Build a Starlette twin of the Flask app for --server uvicorn.
+
+    The SSE stream becomes an async generator cooperatively scheduled on
+    one event loop, so a single process holds every client without a
+    thread or greenlet each. ASGI send() awaits the client socket, which
+    gives natural backpressure — no hand-off deque needed. The frames
+    are the same pre-rendered bytes the WSGI path sends.
+    """
+    import asyncio
+    from starlette.applications import Starlette
+    from starlette.responses import JSONResponse, StreamingResponse
+    from starlette.routing import Route
+
+    async def index(request):
+        return JSONResponse({
+            "name": "Mock MCP SSE Server",
+            "version": "1.0.0",
+            "transport": "SSE (Server-Sent Events)",
+            "endpoints": {
+                "sse": "/events",
+                "health": "/health"
+            },
+            "config": CONFIG
+        })
+
+    async def health(request):
+        return JSONResponse({
+            "status": "healthy",
+            "timestamp": time.time()
+        })
+
+    async def sse_events(request):
+        client_addr = request.client.host if request.client else '?'
+
+        async def stream():
+            print(f"[SSE] Client connected: {client_addr}", file=sys.stderr)
+
+            # 1-3. Pre-rendered opening trio as one chunk
+            yield _STATIC_BLOB
+            event_counter = 4
+            await asyncio.sleep(CONFIG['delay'])
+
+            # 4. Tool call responses + progress notifications
+            tools = ['read_file', 'write_file', 'search_code']
+            iterations = CONFIG['iterations']
+            selected = random.choices(tools, k=iterations)
+            progress_values = tuple((i + 1) * 100 // iterations
+                                    for i in range(iterations))
+            for i in range(iterations):
+                yield format_sse_event(
+                    generate_tool_call_response(4 + i, selected[i]),
+                    event_type='mcp-response',
+                    event_id=event_counter
+                ) + format_sse_event(
+                    generate_progress_notification(progress_values[i]),
+                    event_type='mcp-notification',
+                    event_id=event_counter + 1
+                )
+                event_counter += 2
+                await asyncio.sleep(CONFIG['delay'])
+
+            # 5. Log notifications
+            for level, message in zip(
+                    ['info', 'debug', 'warning'],
+                    ['Processing completed',
+                     'All tools executed successfully',
+                     'Ready for new requests']):
+                yield format_sse_event(
+                    generate_log_notification(level, message),
+                    event_type='mcp-notification',
+                    event_id=event_counter
+                )
+                event_counter += 1
+                await asyncio.sleep(CONFIG['delay'] * 0.5)
+
+            # 6. Keep-alive heartbeat
+            print(f"[SSE] Entering heartbeat mode", file=sys.stderr)
+            while True:
+                await asyncio.sleep(30)
+                yield b":keepalive\n\n"
+
+        return StreamingResponse(
+            stream(),
+            media_type='text/event-stream',
+            headers={
+                'Cache-Control': 'no-cache',
+                'X-Accel-Buffering': 'no',
+                'Connection': 'keep-alive'
+            }
+        )
+
+    return Starlette(routes=[
+        Route('/', index),
+        Route('/health', health),
+        Route('/events', sse_events),
+    ])
+
 def main():
     parser = argparse.ArgumentParser(
         description='Mock MCP Server with SSE Transport'
@@ -363,6 +531,16 @@ def main():
         default='realistic',
         help='Message generation mode'
     )
+    parser.add_argument(
+        '--server',
+        choices=['dev', 'gevent', 'gunicorn', 'uvicorn'],
+        default='dev',
+        help='dev: Werkzeug threaded dev server; gevent: cooperative '
+             'pywsgi server (requires gevent); gunicorn: production '
+             'server with gevent workers (requires gunicorn+gevent); '
+             'uvicorn: ASGI/Starlette async streaming (requires '
+             'starlette+uvicorn)'
+    )
 
     args = parser.parse_args()
 
@@ -378,6 +556,7 @@ def main():
     print(f"Iterations: {args.iterations}")
     print(f"Delay:      {args.delay}s")
     print(f"Mode:       {args.mode}")
+    print(f"Server:     {args.server}")
     print("")
     print(f"SSE Endpoint: http://localhost:{args.port}/events")
     print(f"Health:       http://localhost:{args.port}/health")
@@ -389,12 +568,36 @@ def main():
     print("")
 
     try:
-        app.run(
-            host='0.0.0.0',
-            port=args.port,
-            threaded=True,
-            debug=False
-        )
+        if args.server == 'gevent':
+            from gevent.pywsgi import WSGIServer
+            WSGIServer(('0.0.0.0', args.port), app).serve_forever()
+        elif args.server == 'gunicorn':
+            from gunicorn.app.base import BaseApplication
+
+            class GunicornApp(BaseApplication):
+                """Launch gunicorn in-process around the Flask app"""
+
+                def load_config(self):
+                    self.cfg.set('bind', f'0.0.0.0:{args.port}')
+                    self.cfg.set('workers', 1)
+                    self.cfg.set('worker_class', 'gevent')
+                    self.cfg.set('worker_connections', 1000)
+                    self.cfg.set('keepalive', 75)
+
+                def load(self):
+                    return app
+
+            GunicornApp().run()
+        elif args.server == 'uvicorn':
+            import uvicorn
+            uvicorn.run(build_asgi_app(), host='0.0.0.0', port=args.port)
+        else:
+            app.run(
+                host='0.0.0.0',
+                port=args.port,
+                threaded=True,
+                debug=False
+            )
     except KeyboardInterrupt:
         print("\nShutting down...")
         sys.exit(0)
@@ -5,18 +5,27 @@ This script outputs both valid JSON-RPC and error messages to test Reticle.
 """
 
 import sys
-import json
+import orjson
 import time
 
 def send_jsonrpc(obj):
     """Send a JSON-RPC message to stdout."""
-    print(json.dumps(obj), flush=True)
+    # Encode + trailing newline in one orjson pass, written straight to
+    # the byte stream (no text-layer re-encode); flush keeps ordering
+    # with the line-buffered raw prints
+    sys.stdout.buffer.write(orjson.dumps(obj, option=orjson.OPT_APPEND_NEWLINE))
+    sys.stdout.buffer.flush()
 
 def send_stderr(msg):
     """Send an error message to stderr."""
-    print(msg, file=sys.stderr, flush=True)
+    print(msg, file=sys.stderr)
 
 def main():
+    # Line buffering preserves message ordering with one flush per line
+    # instead of an explicit flush per print
+    sys.stdout.reconfigure(line_buffering=True)
+    sys.stderr.reconfigure(line_buffering=True)
+
     # Send some stderr output first (like Python warnings on startup)
     send_stderr("Warning: This is a test warning from the MCP server")
     send_stderr("DEBUG: Server starting up...")
@@ -30,8 +39,8 @@ def main():
     time.sleep(0.5)
 
     # Send raw stdout (non-JSON)
-    print("This is raw stdout output - not JSON-RPC!", flush=True)
-    print("Another raw line with some debug info", flush=True)
+    print("This is raw stdout output - not JSON-RPC!")
+    print("Another raw line with some debug info")
 
     time.sleep(0.5)
 